@@ -1,135 +1,298 @@
-from fastapi import FastAPI, HTTPException, Depends
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy.orm import sessionmaker
+from fastapi import FastAPI, HTTPException, Depends, Body, Query, Request, Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.redis import RedisBackend
+from fastapi_cache.decorator import cache
+from redis import asyncio as aioredis
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import raiseload, selectinload
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy import bindparam, insert, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.future import select
-from sqlalchemy.ext.declarative import declarative_base
-from models import Product, Order, OrderItem, Base, OrderStatus
-from pydantic import BaseModel
-import asyncio
+from models import Product, Order, OrderItem, Base
+from schemas import ProductCreate, ProductOut, OrderCreate, OrderOut, OrderStatusUpdate
+from contextlib import asynccontextmanager
+import hashlib
+import logging
+import orjson
 import os
 from dotenv import load_dotenv
 
 
+logger = logging.getLogger(__name__)
+
 # Загружаем переменные окружения из .env файла
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+# Миграций в проекте нет, поэтому по умолчанию недостающие таблицы создаются при старте.
+# CREATE_TABLES=0 отключает это, если схемой управляют вне приложения
+CREATE_TABLES = os.getenv("CREATE_TABLES", "1").lower() in ("1", "true", "yes")
 
-engine = create_async_engine(DATABASE_URL, echo=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=AsyncSession)
+# Время жизни кэша каталога товаров (в секундах)
+PRODUCTS_CACHE_EXPIRE = 60
+PRODUCTS_CACHE_NAMESPACE = "products"
+# Максимальное число товаров в одном запросе массового создания
+BULK_CREATE_MAX_PRODUCTS = 1000
 
-app = FastAPI()
+engine = create_async_engine(
+    DATABASE_URL,
+    echo=False,
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=10,
+    max_overflow=20,
+    pool_timeout=30,
+    pool_recycle=1800,  # MySQL закрывает простаивающие соединения по wait_timeout
+    pool_pre_ping=True,
+    pool_reset_on_return="rollback",  # возвращаемое в пул соединение всегда без открытой транзакции
+)
+# expire_on_commit=False: после commit атрибуты объектов не сбрасываются и не перечитываются из БД
+SessionLocal = async_sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 
 # Функция для создания всех таблиц
 async def create_database():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
 
-@app.on_event("startup")
-async def startup_event():
-    # Создаем таблицы при старте приложения
-    await create_database()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if CREATE_TABLES:
+        await create_database()
+    redis = aioredis.from_url(REDIS_URL)
+    FastAPICache.init(RedisBackend(redis), prefix="wh")
+    yield
+    # Корректно закрываем соединения при остановке, чтобы MySQL не держал их до wait_timeout
+    await redis.close()
+    await engine.dispose()
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+
+# Ключ кэша строится по пути и параметрам запроса, без учета сессии БД
+def request_key_builder(func, namespace: str = "", *, request=None, response=None, args=(), kwargs=None):
+    return f"{namespace}:{request.url.path}?{request.url.query}"
 
-# Схемы для валидации данных через Pydantic
-class ProductCreate(BaseModel):
-    name: str
-    description: str
-    price: float
-    stock: int
+# Нарушение уникальности названия товара внутри блока возвращается клиенту как 409
+@asynccontextmanager
+async def product_name_conflict(db: AsyncSession):
+    try:
+        yield
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="Product with this name already exists")
+
+def product_cache_key(product_id: int) -> str:
+    return f"{FastAPICache.get_prefix()}:{PRODUCTS_CACHE_NAMESPACE}:product:{product_id}"
+
+# Изменения уже зафиксированы в БД, поэтому ошибка Redis не должна превращаться в 500:
+# устаревшие записи в худшем случае доживут до истечения TTL
+async def invalidate_products_cache():
+    try:
+        await FastAPICache.clear(namespace=PRODUCTS_CACHE_NAMESPACE)
+    except Exception:
+        logger.warning("Error clearing products cache", exc_info=True)
 
-class OrderCreate(BaseModel):
-    items: list[dict]  # Список товаров в заказе
 
 # CRUD функции
-async def get_db():
+# Позиции заказа подгружаем явно, любая другая ленивая загрузка приводит к ошибке
+ORDER_LOAD_OPTIONS = (selectinload(Order.order_items), raiseload("*"))
+
+# Столбцы товара, которые отдаются клиенту; чтение идет через Core без создания ORM-объектов.
+# В списке товаров описание по умолчанию не выбирается
+PRODUCT_LIST_COLUMNS = (Product.id, Product.name, Product.price, Product.stock)
+PRODUCT_COLUMNS = (*PRODUCT_LIST_COLUMNS, Product.description)
+
+# Запросы горячих эндпоинтов собираются один раз при импорте модуля;
+# .limit()/.offset()/.where() создают от них производные запросы без повторной сборки
+SELECT_PRODUCT_LIST = select(*PRODUCT_LIST_COLUMNS).order_by(Product.id)
+SELECT_PRODUCTS = select(*PRODUCT_COLUMNS).order_by(Product.id)
+SELECT_PRODUCT_BY_ID = select(*PRODUCT_COLUMNS).where(Product.id == bindparam("product_id"))
+SELECT_ORDERS = select(Order).options(*ORDER_LOAD_OPTIONS).order_by(Order.id)
+
+# Сессия нужна только эндпоинтам, которые изменяют данные или загружают связи заказов
+async def get_session():
     async with SessionLocal() as session:
         yield session
 
-@app.post("/products")
-async def create_product(product: ProductCreate, db: AsyncSession = Depends(get_db)):
-    new_product = Product(**product.dict())
+@app.post("/products", response_model=ProductOut)
+async def create_product(product: ProductCreate, db: AsyncSession = Depends(get_session)):
+    new_product = Product(**product.model_dump())
     db.add(new_product)
-    await db.commit()
-    await db.refresh(new_product)
+    async with product_name_conflict(db):
+        await db.commit()
+    await invalidate_products_cache()
     return new_product
 
-@app.get("/products")
-async def list_products(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Product))
-    products = result.scalars().all()
-    return products
+@app.post("/products/bulk")
+async def create_products_bulk(
+    products: list[ProductCreate] = Body(max_length=BULK_CREATE_MAX_PRODUCTS),
+    db: AsyncSession = Depends(get_session),
+):
+    if not products:
+        return {"created": 0}
+    # Массовая вставка через Core минует unit of work и уходит многострочным INSERT
+    async with product_name_conflict(db):
+        await db.execute(insert(Product), [product.model_dump() for product in products])
+        await db.commit()
+    await invalidate_products_cache()
+    return {"created": len(products)}
 
-@app.get("/products/{product_id}")
-async def get_product(product_id: int, db: AsyncSession = Depends(get_db)):
-    product = await db.get(Product, product_id)
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
-    return product
+@app.get("/products", response_model=list[ProductOut], response_model_exclude_unset=True)
+@cache(expire=PRODUCTS_CACHE_EXPIRE, namespace=PRODUCTS_CACHE_NAMESPACE, key_builder=request_key_builder)
+async def list_products(
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    include_description: bool = False,
+):
+    statement = SELECT_PRODUCTS if include_description else SELECT_PRODUCT_LIST
+    # Соединение берется из пула только при промахе кэша
+    async with engine.connect() as conn:
+        result = await conn.execute(statement.limit(limit).offset(offset))
+        rows = result.all()
+    return [dict(row._mapping) for row in rows]
+
+@app.get("/products/export")
+async def export_products():
+    # Выгрузка всего каталога в NDJSON: строки читаются из БД потоком и сразу отправляются клиенту.
+    # Соединение открывается внутри генератора, так как зависимости закрываются до отправки ответа.
+    async def generate():
+        async with engine.connect() as conn:
+            result = await conn.stream(SELECT_PRODUCTS)
+            async for row in result:
+                yield orjson.dumps(dict(row._mapping)) + b"\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
 
-@app.put("/products/{product_id}")
-async def update_product(product_id: int, product_data: ProductCreate, db: AsyncSession = Depends(get_db)):
+# Сериализованный товар кэшируется в Redis в том же пространстве имен, что и остальной каталог,
+# поэтому ETag считается от одних и тех же байтов и при попадании в кэш, и при промахе
+async def load_product_body(product_id: int) -> bytes:
+    backend = FastAPICache.get_backend()
+    cache_key = product_cache_key(product_id)
+    # Как и декоратор @cache, при недоступности Redis логируем ошибку и читаем из БД
+    try:
+        body = await backend.get(cache_key)
+    except Exception:
+        logger.warning("Error retrieving cache key '%s' from backend", cache_key, exc_info=True)
+        body = None
+    if body is None:
+        async with engine.connect() as conn:
+            result = await conn.execute(SELECT_PRODUCT_BY_ID, {"product_id": product_id})
+            row = result.first()
+        if not row:
+            raise HTTPException(status_code=404, detail="Product not found")
+        body = orjson.dumps(ProductOut.model_validate(dict(row._mapping)).model_dump())
+        try:
+            await backend.set(cache_key, body, PRODUCTS_CACHE_EXPIRE)
+        except Exception:
+            logger.warning("Error setting cache key '%s' in backend", cache_key, exc_info=True)
+    return body
+
+@app.get("/products/{product_id}", response_model=ProductOut)
+async def get_product(product_id: int, request: Request):
+    body = await load_product_body(product_id)
+    etag = f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+    # no-cache: клиент может хранить ответ, но обязан каждый раз перепроверять его по ETag
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (tag.strip() for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@app.put("/products/{product_id}", response_model=ProductOut)
+async def update_product(product_id: int, product_data: ProductCreate, db: AsyncSession = Depends(get_session)):
     product = await db.get(Product, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    for key, value in product_data.dict().items():
+    for key, value in product_data.model_dump().items():
         setattr(product, key, value)
     
-    await db.commit()
-    await db.refresh(product)
+    async with product_name_conflict(db):
+        await db.commit()
+    await invalidate_products_cache()
     return product
 
 @app.delete("/products/{product_id}")
-async def delete_product(product_id: int, db: AsyncSession = Depends(get_db)):
+async def delete_product(product_id: int, db: AsyncSession = Depends(get_session)):
     product = await db.get(Product, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
     await db.delete(product)
     await db.commit()
+    await invalidate_products_cache()
     return {"message": "Product deleted successfully"}
 
-@app.post("/orders")
-async def create_order(order_data: OrderCreate, db: AsyncSession = Depends(get_db)):
+@app.post("/orders", response_model=OrderOut)
+async def create_order(order_data: OrderCreate, db: AsyncSession = Depends(get_session)):
     order = Order()
     db.add(order)
     
+    # Проверяем существование всех товаров заказа одним запросом
+    product_ids = [item.product_id for item in order_data.items]
+    result = await db.execute(select(Product.id).where(Product.id.in_(product_ids)))
+    existing_ids = set(result.scalars().all())
+    
+    # Суммируем количество по каждому товару, чтобы списывать его одним UPDATE
+    quantities = {}
     for item in order_data.items:
-        product = await db.get(Product, item["product_id"])
-        if not product or product.stock < item["quantity"]:
+        if item.product_id not in existing_ids:
+            raise HTTPException(status_code=400, detail="Insufficient stock")
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+    
+    # Атомарное списание: проверка остатка и уменьшение выполняются одним UPDATE.
+    # Строки обновляются в порядке id, чтобы параллельные заказы блокировали их
+    # в одном и том же порядке и не попадали во взаимную блокировку
+    for product_id, quantity in sorted(quantities.items()):
+        result = await db.execute(
+            update(Product)
+            .where(Product.id == product_id, Product.stock >= quantity)
+            .values(stock=Product.stock - quantity)
+        )
+        if result.rowcount == 0:
+            await db.rollback()
             raise HTTPException(status_code=400, detail="Insufficient stock")
-        
-        product.stock -= item["quantity"]
-        order_item = OrderItem(order=order, product=product, quantity=item["quantity"])
-        db.add(order_item)
+    
+    order_items = [
+        OrderItem(order=order, product_id=item.product_id, quantity=item.quantity)
+        for item in order_data.items
+    ]
+    
+    # Добавляем позиции одной пачкой. На MySQL (aiomysql) нет INSERT ... RETURNING, поэтому ORM
+    # все равно вставляет каждую позицию отдельным INSERT, чтобы получить ее id
+    db.add_all(order_items)
     
     await db.commit()
-    await db.refresh(order)
+    # Остатки товаров изменились: сбрасываем и карточки, и страницы списка,
+    # чтобы /products и /products/{id} не расходились в значении stock
+    await invalidate_products_cache()
     return order
 
-@app.get("/orders")
-async def list_orders(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Order))
+@app.get("/orders", response_model=list[OrderOut])
+async def list_orders(
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_session),
+):
+    result = await db.execute(SELECT_ORDERS.limit(limit).offset(offset))
     orders = result.scalars().all()
     return orders
 
-@app.get("/orders/{order_id}")
-async def get_order(order_id: int, db: AsyncSession = Depends(get_db)):
-    order = await db.get(Order, order_id)
+@app.get("/orders/{order_id}", response_model=OrderOut)
+async def get_order(order_id: int, db: AsyncSession = Depends(get_session)):
+    result = await db.execute(SELECT_ORDERS.where(Order.id == order_id))
+    order = result.scalar_one_or_none()
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     return order
 
-class OrderStatusUpdate(BaseModel):
-    status: OrderStatus
-
-@app.patch("/orders/{order_id}/status")
-async def update_order_status(order_id: int, status_data: OrderStatusUpdate, db: AsyncSession = Depends(get_db)):
-    order = await db.get(Order, order_id)
+@app.patch("/orders/{order_id}/status", response_model=OrderOut)
+async def update_order_status(order_id: int, status_data: OrderStatusUpdate, db: AsyncSession = Depends(get_session)):
+    order = await db.get(Order, order_id, options=ORDER_LOAD_OPTIONS)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
     order.status = status_data.status
     await db.commit()
-    await db.refresh(order)
     return order
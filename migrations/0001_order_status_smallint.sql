@@ -0,0 +1,12 @@
+-- Перевод orders.status из ENUM('processing','sent','delivered') в SMALLINT-код (1, 2, 3).
+-- Нужен для баз, созданных до хранения статуса числом: create_all не изменяет существующие таблицы.
+ALTER TABLE orders MODIFY status VARCHAR(20) NULL;
+
+UPDATE orders
+SET status = CASE status
+    WHEN 'processing' THEN '1'
+    WHEN 'sent' THEN '2'
+    WHEN 'delivered' THEN '3'
+END;
+
+ALTER TABLE orders MODIFY status SMALLINT NULL;
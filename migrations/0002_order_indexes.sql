@@ -0,0 +1,5 @@
+-- Индексы по внешним ключам позиций заказа и составной индекс для выборок заказов по статусу.
+-- Применяется после 0001: индекс ix_orders_status_created строится по уже числовому столбцу status.
+CREATE INDEX ix_order_items_order_id ON order_items (order_id);
+CREATE INDEX ix_order_items_product_id ON order_items (product_id);
+CREATE INDEX ix_orders_status_created ON orders (status, created_at);
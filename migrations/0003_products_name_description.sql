@@ -0,0 +1,4 @@
+-- Расширение описания товара до VARCHAR(1024) и уникальный индекс по названию.
+-- Перед созданием индекса в таблице не должно быть товаров с одинаковым названием.
+ALTER TABLE products MODIFY description VARCHAR(1024) NULL;
+CREATE UNIQUE INDEX ix_products_name ON products (name);
@@ -1,8 +1,5 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Enum
-from sqlalchemy.orm import relationship
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.future import select
+from sqlalchemy import Column, Integer, SmallInteger, String, Float, ForeignKey, DateTime, Index, TypeDecorator
+from sqlalchemy.orm import declarative_base, relationship
 import enum
 import datetime
 
@@ -13,23 +10,47 @@ class OrderStatus(str, enum.Enum):
     processing = "в процессе"
     sent = "отправлен"
     delivered = "доставлен"
+
+# В БД статус хранится числовым кодом, в приложении и API — значением OrderStatus
+ORDER_STATUS_CODES = {
+    OrderStatus.processing: 1,
+    OrderStatus.sent: 2,
+    OrderStatus.delivered: 3,
+}
+ORDER_STATUS_BY_CODE = {code: status for status, code in ORDER_STATUS_CODES.items()}
+
+class OrderStatusType(TypeDecorator):
+    impl = SmallInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return ORDER_STATUS_CODES[OrderStatus(value)]
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return ORDER_STATUS_BY_CODE[value]
     
 class Product(Base):
     __tablename__ = "products"
     
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String(255), nullable=False)  # Укажите длину для столбца name
-    description = Column(String(500), nullable=True)  # Укажите длину для столбца description
+    name = Column(String(255), nullable=False, unique=True, index=True)  # Укажите длину для столбца name
+    description = Column(String(1024), nullable=True)  # Укажите длину для столбца description
     price = Column(Float, nullable=False)
     stock = Column(Integer, default=0)
 
 
 class Order(Base):
     __tablename__ = "orders"
+    # Составной индекс для выборок по статусу с сортировкой по дате создания
+    __table_args__ = (Index("ix_orders_status_created", "status", "created_at"),)
     
     id = Column(Integer, primary_key=True, index=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
-    status = Column(Enum(OrderStatus), default=OrderStatus.processing)
+    status = Column(OrderStatusType, default=OrderStatus.processing)  # индексируется составным ix_orders_status_created
     
     order_items = relationship("OrderItem", back_populates="order")
 
@@ -37,8 +58,8 @@ class OrderItem(Base):
     __tablename__ = "order_items"
     
     id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False)
-    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False, index=True)
     quantity = Column(Integer, nullable=False)
     
     order = relationship("Order", back_populates="order_items")
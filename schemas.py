@@ -0,0 +1,46 @@
+from pydantic import BaseModel, ConfigDict, Field
+from models import OrderStatus
+import datetime
+
+# Схемы для валидации данных через Pydantic
+class ProductCreate(BaseModel):
+    name: str = Field(max_length=255)
+    # Ширина столбца в базах, где еще не применена миграция 0003 (VARCHAR(500))
+    description: str = Field(max_length=500)
+    price: float
+    stock: int
+
+class OrderItemIn(BaseModel):
+    product_id: int
+    quantity: int = Field(gt=0)
+
+class OrderCreate(BaseModel):
+    items: list[OrderItemIn] = Field(min_length=1)  # Список товаров в заказе
+
+# Схемы ответов: FastAPI сериализует их вместо ORM-объектов
+class ProductOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    name: str
+    description: str | None = None
+    price: float
+    stock: int
+
+class OrderItemOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    product_id: int
+    quantity: int
+
+class OrderOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    created_at: datetime.datetime
+    status: OrderStatus
+    order_items: list[OrderItemOut]
+
+class OrderStatusUpdate(BaseModel):
+    status: OrderStatus